@@ -0,0 +1,4 @@
+import hashlib
+
+def content_key(text: str, model_name: str) -> str:
+    return hashlib.blake2b(text.encode('utf-8')).hexdigest() + model_name
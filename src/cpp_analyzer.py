@@ -1,8 +1,38 @@
 import os
-import json
+import mmap
+import multiprocessing
 import re
-from typing import List, Dict, Optional
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Iterator, List, Dict, Optional
 from dataclasses import dataclass
+import orjson
+import tree_sitter_cpp
+from tree_sitter import Language, Parser
+
+CPP_LANGUAGE = Language(tree_sitter_cpp.language())
+
+CPP_EXTENSIONS = ('.cpp', '.hpp', '.cxx', '.hxx', '.cc')
+
+CPP_KEYWORDS = {
+    'if', 'else', 'for', 'while', 'do', 'switch', 'case', 'default',
+    'break', 'continue', 'return', 'goto', 'try', 'catch', 'throw',
+    'new', 'delete', 'sizeof', 'typedef', 'struct', 'class', 'enum',
+    'union', 'namespace', 'using', 'public', 'private', 'protected',
+    'virtual', 'static', 'const', 'volatile', 'inline', 'explicit',
+    'friend', 'template', 'typename', 'auto', 'register', 'extern'
+}
+
+# Matched against whole files as bytes (usually an mmap), so every class excludes newlines
+# to keep each match on one line
+_FUNC_RE = re.compile(
+    rb'^[ \t]*(?:(?:static|virtual|inline|explicit|friend|template[ \t]*<[^>\n]*>)[ \t]+)*'
+    rb'([^;{\n]*?)[ \t]+'
+    rb'([a-zA-Z_]\w*(?:[ \t]*<[^>\n]*>)?[ \t]*::[ \t]*[a-zA-Z_]\w*(?:[ \t]*<[^>\n]*>)?(?:[ \t]*::[ \t]*[a-zA-Z_]\w*(?:[ \t]*<[^>\n]*>)?)*)'
+    rb'[ \t]*\(([^)\n]*)\)[ \t]*(?:const)?[ \t]*(?:noexcept)?[ \t]*(?::[^;{\n]*?)?[ \t]*\{',
+    re.MULTILINE
+)
+_BRACE_RE = re.compile(rb'[{}]')
+_PARAM_RE = re.compile(r'(.+?)\s+(\w+)(?:\s*=\s*[^,]*)?$')
 
 @dataclass
 class FunctionInfo:
@@ -21,150 +51,336 @@ class FunctionInfo:
     class_name: Optional[str] = None
     full_qualified_name: Optional[str] = None
 
+def scan_cpp_files(path: str) -> Iterator[str]:
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from scan_cpp_files(entry.path)
+                elif entry.is_file() and entry.name.endswith(CPP_EXTENSIONS):
+                    yield entry.path
+    except OSError as e:
+        print(f"Error scanning {path}: {e}")
+
+def split_params(params_str: str) -> Iterator[str]:
+    depth = 0
+    start = 0
+    for i, char in enumerate(params_str):
+        if char in '<([{':
+            depth += 1
+        elif char in '>)]}':
+            depth = max(depth - 1, 0)
+        elif char == ',' and depth == 0:
+            yield params_str[start:i]
+            start = i + 1
+    yield params_str[start:]
+
+def node_text(node) -> str:
+    return node.text.decode('utf-8', errors='ignore')
+
+def inner_declarator(declarator):
+    # reference_declarator and parenthesized_declarator have no 'declarator' field
+    inner = declarator.child_by_field_name('declarator')
+    if inner is None:
+        inner = next((child for child in declarator.named_children
+                      if child.type in ('identifier', 'field_identifier') or child.type.endswith('declarator')), None)
+    return inner
+
+def find_identifier(declarator):
+    while declarator is not None:
+        if declarator.type in ('identifier', 'field_identifier'):
+            return declarator
+        declarator = inner_declarator(declarator)
+    return None
+
 class CppAnalyzer:
-    def __init__(self, repo_path: str):
+    def __init__(self, repo_path: str, cpp_parser: str = 'tree-sitter'):
         self.repo_path = repo_path
+        self.cpp_parser = cpp_parser
+        if self.cpp_parser == 'tree-sitter':
+            self.parser = Parser(CPP_LANGUAGE)
+        elif self.cpp_parser != 'regex':
+            raise ValueError(f"Unsupported C++ parser: {self.cpp_parser}")
         self.ALGORITHM_KEYWORDS = ['sort', 'search', 'hash', 'tree', 'graph', 'dynamic programming', 'dp']
         self.MATH_KEYWORDS = ['sqrt', 'pow', 'matrix', 'vector', 'eigen', 'sin', 'cos', 'tan']
     
     def find_cpp_files(self) -> List[str]:
         cpp_files = []
-        for root, _, files in os.walk(self.repo_path):
-            for file in files:
-                if file.endswith(('.cpp', '.hpp', '.cxx', '.hxx', '.cc')):
-                    cpp_files.append(os.path.join(root, file))
+        subdirs = []
+        try:
+            with os.scandir(self.repo_path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.is_file() and entry.name.endswith(CPP_EXTENSIONS):
+                        cpp_files.append(entry.path)
+        except OSError as e:
+            print(f"Error scanning {self.repo_path}: {e}")
+            return cpp_files
+
+        with ThreadPoolExecutor() as executor:
+            for subdir_files in executor.map(lambda path: list(scan_cpp_files(path)), subdirs):
+                cpp_files.extend(subdir_files)
         return cpp_files
     
     def extract_functions_from_text(self, content: str, file_path: str) -> List[FunctionInfo]:
+        if self.cpp_parser == 'tree-sitter':
+            return self.extract_functions_with_tree_sitter(content.encode('utf-8'), file_path)
+        return self.extract_functions_with_regex(content.encode('utf-8'), file_path)
+
+    def extract_functions_with_tree_sitter(self, source: bytes, file_path: str) -> List[FunctionInfo]:
+        tree = self.parser.parse(source)
         functions = []
-        
-        cpp_keywords = {
-            'if', 'else', 'for', 'while', 'do', 'switch', 'case', 'default',
-            'break', 'continue', 'return', 'goto', 'try', 'catch', 'throw',
-            'new', 'delete', 'sizeof', 'typedef', 'struct', 'class', 'enum',
-            'union', 'namespace', 'using', 'public', 'private', 'protected',
-            'virtual', 'static', 'const', 'volatile', 'inline', 'explicit',
-            'friend', 'template', 'typename', 'auto', 'register', 'extern'
-        }
-        
-        lines = content.split('\n')
-        
-        function_pattern = r'^\s*(?:(?:static|virtual|inline|explicit|friend|template\s*<[^>]*>)\s+)*' \
-                          r'([^;{]*?)\s+' \
-                          r'([a-zA-Z_]\w*(?:\s*<[^>]*>)?\s*::\s*[a-zA-Z_]\w*(?:\s*<[^>]*>)?(?:\s*::\s*[a-zA-Z_]\w*(?:\s*<[^>]*>)?)*)' \
-                          r'\s*\(([^)]*)\)\s*(?:const)?\s*(?:noexcept)?\s*(?::[^;{]*?)?\s*\{'
-        
-        i = 0
-        while i < len(lines):
-            line = lines[i]
-            match = re.match(function_pattern, line.strip())
-            
-            if match:
-                return_type, full_qualified_name, params_str = match.groups()
-                
-                parts = full_qualified_name.split('::')
-                func_name = parts[-1].strip()
-                
-                if (func_name.startswith('~') or 'operator' in func_name or
-                    func_name in cpp_keywords):
-                    i += 1
+
+        cursor = tree.walk()
+        visited_children = False
+        while True:
+            node = cursor.node
+            if not visited_children and node.type == 'function_definition':
+                function_info = self.build_function_info(node, source, file_path)
+                if function_info:
+                    functions.append(function_info)
+                visited_children = True
+            elif not visited_children and cursor.goto_first_child():
+                continue
+            if cursor.goto_next_sibling():
+                visited_children = False
+            elif cursor.goto_parent():
+                visited_children = True
+            else:
+                break
+
+        return functions
+
+    def build_function_info(self, node, source: bytes, file_path: str) -> Optional[FunctionInfo]:
+        declarator = node.child_by_field_name('declarator')
+        while declarator is not None and declarator.type != 'function_declarator':
+            declarator = inner_declarator(declarator)
+        if declarator is None:
+            return None
+
+        name_node = declarator.child_by_field_name('declarator')
+        qualifiers = []
+        while name_node is not None and name_node.type == 'qualified_identifier':
+            scope = name_node.child_by_field_name('scope')
+            if scope is not None:
+                qualifiers.append(node_text(scope))
+            name_node = name_node.child_by_field_name('name')
+        if name_node is None or name_node.type in ('destructor_name', 'operator_name'):
+            return None
+
+        func_name = node_text(name_node)
+        if 'operator' in func_name or func_name in CPP_KEYWORDS:
+            return None
+
+        namespaces = []
+        enclosing_class = None
+        parent = node.parent
+        while parent is not None:
+            if parent.type == 'namespace_definition':
+                name = parent.child_by_field_name('name')
+                if name is not None:
+                    namespaces.insert(0, node_text(name))
+            elif parent.type in ('class_specifier', 'struct_specifier') and enclosing_class is None:
+                name = parent.child_by_field_name('name')
+                if name is not None:
+                    enclosing_class = node_text(name)
+            parent = parent.parent
+
+        if qualifiers:
+            class_name = qualifiers[-1]
+            namespaces.extend(qualifiers[:-1])
+        else:
+            class_name = enclosing_class
+        namespace = '::'.join(namespaces) or None
+        full_qualified_name = '::'.join(namespaces + ([class_name] if class_name else []) + [func_name])
+
+        # Take the source up to the function declarator so qualifiers and */& are kept
+        return_type = ''
+        type_node = node.child_by_field_name('type')
+        type_start = next((child.start_byte for child in node.children
+                           if child.type == 'type_qualifier' or child == type_node), None)
+        if type_start is not None:
+            return_type = source[type_start:declarator.start_byte].decode('utf-8', errors='ignore').strip()
+        for child in declarator.children:
+            if child.type == 'trailing_return_type':
+                return_type = node_text(child).lstrip('->').strip()
+
+        parameters = []
+        params_node = declarator.child_by_field_name('parameters')
+        if params_node is not None:
+            for param in params_node.named_children:
+                if param.type not in ('parameter_declaration', 'optional_parameter_declaration'):
                     continue
-                
-                if len(parts) >= 3:
-                    namespace = parts[0].strip()
-                    class_name = parts[1].strip()
-                elif len(parts) == 2:
-                    namespace = None
-                    class_name = parts[0].strip()
-                else:
-                    i += 1
+                param_text = node_text(param)
+                if param_text == 'void':
                     continue
-                
-                parameters = []
-                if params_str.strip():
-                    param_parts = [p.strip() for p in params_str.split(',')]
-                    for param in param_parts:
-                        if param and param != 'void':
-                            param_match = re.match(r'(.+?)\s+(\w+)(?:\s*=\s*[^,]*)?$', param)
-                            if param_match:
-                                param_type, param_name = param_match.groups()
-                                parameters.append({'name': param_name, 'type': param_type.strip()})
-                            else:
-                                parameters.append({'name': 'param', 'type': param.strip()})
-                
-                brace_count = 1
-                line_start = i + 1
-                line_end = i + 1
-                j = i + 1
-                
-                while j < len(lines) and brace_count > 0:
-                    for char in lines[j]:
-                        if char == '{':
-                            brace_count += 1
-                        elif char == '}':
-                            brace_count -= 1
-                            if brace_count == 0:
-                                line_end = j + 1
-                                break
-                    j += 1
-                
-                if line_end > line_start:
-                    body_lines = lines[line_start:line_end]
-                    body_str = '\n'.join(body_lines)
-                    body_preview = body_str[:500] + '...' if len(body_str) > 500 else body_str
+                default_value = param.child_by_field_name('default_value')
+                type_end = default_value.start_byte if default_value is not None else param.end_byte
+                identifier = find_identifier(param.child_by_field_name('declarator'))
+                if identifier is not None:
+                    param_type = (source[param.start_byte:identifier.start_byte] +
+                                  source[identifier.end_byte:type_end]).decode('utf-8', errors='ignore')
+                    parameters.append({'name': node_text(identifier), 'type': param_type.strip().rstrip('=').strip()})
                 else:
-                    body_str = ""
-                    body_preview = ""
-                
-                algorithm_keywords = [keyword for keyword in self.ALGORITHM_KEYWORDS if keyword in body_str.lower()]
-                includes_math = any(keyword in body_str.lower() for keyword in self.MATH_KEYWORDS)
-                
-                function_info = FunctionInfo(
-                    name=func_name,
-                    file_path=file_path,
-                    line_start=line_start,
-                    line_end=line_end,
-                    parameters=parameters,
-                    return_type=return_type.strip() if return_type else "",
-                    docstring=None,
-                    body_preview=body_preview,
-                    includes_math=includes_math,
-                    algorithm_keywords=algorithm_keywords,
-                    namespace=namespace,
-                    class_name=class_name,
-                    full_qualified_name=full_qualified_name.strip()
-                )
-                functions.append(function_info)
-                i = line_end
+                    param_type = source[param.start_byte:type_end].decode('utf-8', errors='ignore')
+                    parameters.append({'name': 'param', 'type': param_type.strip().rstrip('=').strip()})
+
+        body_node = node.child_by_field_name('body')
+        body_str = node_text(body_node) if body_node is not None else ""
+        body_preview = body_str[:500] + '...' if len(body_str) > 500 else body_str
+
+        algorithm_keywords = [keyword for keyword in self.ALGORITHM_KEYWORDS if keyword in body_str.lower()]
+        includes_math = any(keyword in body_str.lower() for keyword in self.MATH_KEYWORDS)
+
+        return FunctionInfo(
+            name=func_name,
+            file_path=file_path,
+            line_start=node.start_point.row + 1,
+            line_end=node.end_point.row + 1,
+            parameters=parameters,
+            return_type=return_type,
+            docstring=None,
+            body_preview=body_preview,
+            includes_math=includes_math,
+            algorithm_keywords=algorithm_keywords,
+            namespace=namespace,
+            class_name=class_name,
+            full_qualified_name=full_qualified_name
+        )
+
+    def extract_functions_with_regex(self, content: bytes, file_path: str) -> List[FunctionInfo]:
+        functions = []
+        
+        line_no = 1
+        line_pos = 0
+        pos = 0
+        while True:
+            match = _FUNC_RE.search(content, pos)
+            if not match:
+                break
+            pos = match.end()
+
+            return_type, full_qualified_name, params_str = (group.decode('utf-8', errors='ignore') for group in match.groups())
+            
+            parts = full_qualified_name.split('::')
+            func_name = parts[-1].strip()
+            
+            if (func_name.startswith('~') or 'operator' in func_name or
+                func_name in CPP_KEYWORDS):
+                continue
+            
+            if len(parts) >= 3:
+                namespace = parts[0].strip()
+                class_name = parts[1].strip()
+            elif len(parts) == 2:
+                namespace = None
+                class_name = parts[0].strip()
             else:
-                i += 1
+                continue
+            
+            parameters = []
+            if params_str.strip():
+                param_parts = [p.strip() for p in split_params(params_str)]
+                for param in param_parts:
+                    if param and param != 'void':
+                        param_match = _PARAM_RE.match(param)
+                        if param_match:
+                            param_type, param_name = param_match.groups()
+                            parameters.append({'name': param_name, 'type': param_type.strip()})
+                        else:
+                            parameters.append({'name': 'param', 'type': param.strip()})
+            
+            # mmap has no count(), so count newlines on the slice since the previous match
+            line_no += content[line_pos:match.start()].count(b'\n')
+            line_pos = match.start()
+            line_start = line_no
+            line_end = line_no
+
+            # Jump between braces with the C-level scanner instead of walking every character
+            brace_count = 1
+            body_end = None
+            for brace in _BRACE_RE.finditer(content, match.end()):
+                brace_count += 1 if brace.group() == b'{' else -1
+                if brace_count == 0:
+                    body_end = brace.end()
+                    break
+            
+            if body_end is not None:
+                body_str = content[match.end() - 1:body_end].decode('utf-8', errors='ignore')
+                line_end = line_start + content[match.start():match.end()].count(b'\n') + body_str.count('\n')
+                body_preview = body_str[:500] + '...' if len(body_str) > 500 else body_str
+                next_line = content.find(b'\n', body_end)
+                pos = len(content) if next_line == -1 else next_line + 1
+            else:
+                body_str = ""
+                body_preview = ""
+            
+            algorithm_keywords = [keyword for keyword in self.ALGORITHM_KEYWORDS if keyword in body_str.lower()]
+            includes_math = any(keyword in body_str.lower() for keyword in self.MATH_KEYWORDS)
+            
+            function_info = FunctionInfo(
+                name=func_name,
+                file_path=file_path,
+                line_start=line_start,
+                line_end=line_end,
+                parameters=parameters,
+                return_type=return_type.strip() if return_type else "",
+                docstring=None,
+                body_preview=body_preview,
+                includes_math=includes_math,
+                algorithm_keywords=algorithm_keywords,
+                namespace=namespace,
+                class_name=class_name,
+                full_qualified_name=full_qualified_name.strip()
+            )
+            functions.append(function_info)
         
         return functions
     
+    def analyze_file(self, file_path: str) -> List[FunctionInfo]:
+        try:
+            with open(file_path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return []
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as source:
+                    if self.cpp_parser == 'tree-sitter':
+                        return self.extract_functions_with_tree_sitter(source, file_path)
+                    return self.extract_functions_with_regex(source, file_path)
+        except Exception as e:
+            print(f"Error analyzing {file_path}: {e}")
+            return []
+
     def analyze_repository(self) -> List[FunctionInfo]:
         cpp_files = self.find_cpp_files()
         functions = []
         
-        for i, file_path in enumerate(cpp_files):
-            print(f"Analyzing file {i+1}/{len(cpp_files)}: {os.path.basename(file_path)}")
-            try:
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read()
-                file_functions = self.extract_functions_from_text(content, file_path)
+        # Never fork: the caller may already run Chroma and torch threads, which fork() can deadlock
+        start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        with ProcessPoolExecutor(mp_context=multiprocessing.get_context(start_method),
+                                 initializer=_init_worker, initargs=(self.repo_path, self.cpp_parser)) as executor:
+            results = executor.map(_analyze_one_file, cpp_files, chunksize=16)
+            for i, (file_path, file_functions) in enumerate(zip(cpp_files, results)):
+                print(f"Analyzed file {i+1}/{len(cpp_files)}: {os.path.basename(file_path)}")
                 functions.extend(file_functions)
-            except Exception as e:
-                print(f"Error analyzing {file_path}: {e}")
-                continue
         
         print(f"Analysis complete. Total functions found: {len(functions)}")
         return functions
     
     def save_analysis(self, functions: List[FunctionInfo], output_path: str):
-        if not os.path.exists(output_path):
-            os.makedirs(output_path)
-        
+        os.makedirs(output_path, exist_ok=True)
         output_file = os.path.join(output_path, 'cpp_analysis.json')
         
-        functions_dict = [func.__dict__ for func in functions]
-        with open(output_file, 'w') as f:
-            json.dump(functions_dict, f, indent=4)
+        # orjson serializes dataclasses natively, no intermediate dicts needed
+        with open(output_file, 'wb') as f:
+            f.write(orjson.dumps(functions, option=orjson.OPT_INDENT_2))
+
+
+_worker_analyzer: Optional[CppAnalyzer] = None
+
+def _init_worker(repo_path: str, cpp_parser: str):
+    global _worker_analyzer
+    _worker_analyzer = CppAnalyzer(repo_path, cpp_parser)
+
+def _analyze_one_file(file_path: str) -> List[FunctionInfo]:
+    return _worker_analyzer.analyze_file(file_path)
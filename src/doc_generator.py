@@ -1,31 +1,53 @@
 import os
-from typing import List, Dict, Any
+import asyncio
+import json
+from typing import List, Dict, Any, Optional
 import ollama
+from diskcache import Cache
 import google.generativeai as genai
 from src.cpp_analyzer import FunctionInfo
+from src.cache import content_key
 from src.paper_processor import PaperProcessor
 from src.function_describer import FunctionDescriber
 import pprint
 
+BUNDLE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "relevant": {"type": "boolean"},
+        "doc": {"type": "string"}
+    },
+    "required": ["relevant", "doc"]
+}
+
+def is_json_object(text: str) -> bool:
+    try:
+        return isinstance(json.loads(text), dict)
+    except json.JSONDecodeError:
+        return False
+
 class DocGenerator:
     def __init__(self, config: Dict[str, Any]):
         self.config = config
         self.provider = config.get('llm_provider', 'ollama')
+        self.cache = Cache(config.get('cache_path', 'data/cache'))
 
         if self.provider == 'ollama':
             self.ollama_base_url = config.get('ollama_base_url', 'http://localhost:11434')
             self.ollama_model_name = config.get('ollama_model_name', 'llama3.1')
+            self.ollama_client = ollama.AsyncClient(host=self.ollama_base_url)
         elif self.provider == 'gemini':
             self.gemini_api_key = config.get('gemini_api_key')
             self.gemini_model_name = config.get('gemini_model_name', 'gemini-1.5-flash')
             if self.gemini_api_key:
                 genai.configure(api_key=self.gemini_api_key)
+                self._model = genai.GenerativeModel(self.gemini_model_name)
             else:
                 raise ValueError("Gemini API key is required when using Gemini provider")
         else:
             raise ValueError(f"Unsupported LLM provider: {self.provider}")
 
-    def create_function_documentation(self, function_info: FunctionInfo, relevant_paper_content: List[Dict], config: Dict[str, Any], include_academic_context: bool = True) -> str:
+    async def create_function_documentation(self, function_info: FunctionInfo, relevant_paper_content: List[Dict], config: Dict[str, Any], include_academic_context: bool = True) -> str:
         if include_academic_context and relevant_paper_content:
             context_str = "\n".join([doc['text'] for doc in relevant_paper_content])
 
@@ -83,40 +105,118 @@ class DocGenerator:
             """
 
         if self.provider == 'ollama':
-            return self.generate_with_ollama(prompt, config)
+            return await self.generate_with_ollama(prompt, config)
         elif self.provider == 'gemini':
-            return self.generate_with_gemini(prompt, config)
+            return await self.generate_with_gemini(prompt, config)
         else:
             raise ValueError(f"Unsupported provider: {self.provider}")
 
-    def generate_with_ollama(self, prompt: str, config: Dict[str, Any]) -> str:
+    async def generate_bundle(self, function_info: FunctionInfo, paper_summary: str, relevant_paper_content: List[Dict], config: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Decide paper relevance and write the documentation in a single LLM call.
+        Returns a dict with a boolean 'relevant' and the markdown 'doc'.
+        """
+        context_str = "\n".join([doc['text'] for doc in relevant_paper_content])
+
+        prompt = f"""
+        Generate professional markdown documentation for the following C++ function, and decide whether
+        the function is relevant to the academic paper summarized below.
+        Consider algorithmic concepts, data structures, computational approaches, and technical domains.
+
+        **Function Details:**
+        - **Name:** `{function_info.name}`
+        - **Description:** {function_info.function_description}
+        - **Parameters:** `{function_info.parameters}`
+        - **Return Type:** `{function_info.return_type}`
+        - **Algorithm Keywords:** `{', '.join(function_info.algorithm_keywords)}`
+
+        **Function Body Preview:**
+        ```cpp
+        {function_info.body_preview}
+        ```
+
+        **Paper Summary:**
+        {paper_summary}
+
+        **Retrieved Academic Paper Context:**
+        ---
+        {context_str}
+        ---
+
+        **Documentation Requirements:**
+        1.  **Purpose:** A clear, concise description of what the function does.
+        2.  **Algorithm:** Describe the algorithm used.
+        3.  **Parameters:** List and explain each parameter.
+        4.  If the function is relevant to the paper, an **Academic Foundation** section that explicitly cites
+            how the implementation relates to the paper context. Otherwise, an **Implementation Notes** section
+            with key implementation details and considerations, and no reference to the paper.
+
+        **Output Format (JSON):**
+        {{"relevant": true or false, "doc": "<markdown documentation>"}}
+        """
+
+        if self.provider == 'ollama':
+            response = await self.generate_with_ollama(prompt, config, response_schema=BUNDLE_SCHEMA)
+        elif self.provider == 'gemini':
+            response = await self.generate_with_gemini(prompt, config, response_schema=BUNDLE_SCHEMA)
+        else:
+            raise ValueError(f"Unsupported provider: {self.provider}")
+
+        try:
+            bundle = json.loads(response)
+            return {'relevant': bundle.get('relevant') is True, 'doc': str(bundle.get('doc', ''))}
+        except (json.JSONDecodeError, AttributeError):
+            # Usually a doc truncated at max_doc_length; never write the raw JSON fragment as the doc
+            print(f"    - Could not parse documentation bundle for `{function_info.name}`, falling back to plain documentation")
+            doc = await self.create_function_documentation(
+                function_info, relevant_paper_content, config, include_academic_context=False
+            )
+            return {'relevant': False, 'doc': doc}
+
+    async def generate_with_ollama(self, prompt: str, config: Dict[str, Any], response_schema: Optional[Dict[str, Any]] = None) -> str:
+        key = content_key(prompt, self.ollama_model_name)
+        cached = self.cache.get(key)
+        if cached is not None and (response_schema is None or is_json_object(cached)):
+            return cached
         try:
-            response = ollama.chat(
+            response = await self.ollama_client.chat(
                 model=self.ollama_model_name,
                 messages=[
                     {"role": "system", "content": "You are a C++ documentation expert."},
                     {"role": "user", "content": prompt}
                 ],
+                format=response_schema or "",
                 options={
                     "num_predict": config.get('max_doc_length', 2000)
                 }
             )
-            return response['message']['content']
+            result = response['message']['content']
+            if response_schema is None or is_json_object(result):
+                self.cache.set(key, result)
+            return result
         except Exception as e:
             return f"Error generating documentation with Ollama: {e}"
 
-    def generate_with_gemini(self, prompt: str, config: Dict[str, Any]) -> str:
+    async def generate_with_gemini(self, prompt: str, config: Dict[str, Any], response_schema: Optional[Dict[str, Any]] = None) -> str:
+        key = content_key(prompt, self.gemini_model_name)
+        cached = self.cache.get(key)
+        if cached is not None and (response_schema is None or is_json_object(cached)):
+            return cached
         try:
-            model = genai.GenerativeModel(self.gemini_model_name)
             generation_config = genai.types.GenerationConfig(
                 max_output_tokens=config.get('max_doc_length', 2000),
-                temperature=0.7
+                temperature=0.7,
+                response_mime_type="application/json" if response_schema else "text/plain",
+                response_schema=response_schema
             )
-            response = model.generate_content(
+            response = await self._model.generate_content_async(
                 prompt,
                 generation_config=generation_config
             )
-            return response.text
+            result = response.text
+            if response_schema is None or is_json_object(result):
+                self.cache.set(key, result)
+            return result
         except Exception as e:
             return f"Error generating documentation with Gemini: {e}"
 
@@ -129,47 +229,89 @@ class FunctionDocGen:
         self.config = config
 
     def generate_complete_documentation(self) -> Dict[str, str]:
+        return asyncio.run(self.generate_complete_documentation_async())
+
+    async def generate_complete_documentation_async(self) -> Dict[str, str]:
         print("Analyzing C++ repository...")
         functions = self.cpp_analyzer.analyze_repository()
 
         print("Processing paper..")
-        self.paper_processor.process_paper(self.config['paper_path'])
+        paper_sections = self.paper_processor.process_paper(self.config['paper_path'])
+        max_summary_chars = self.config.get('max_summary_chars', 2000)
+        paper_summary = (paper_sections.get("Abstract", "")[:max_summary_chars] + "\n" +
+                         paper_sections.get("Introduction", "")[:max_summary_chars])
 
-        paper_sections = self.paper_processor.extract_text_from_pdf(self.config['paper_path'])
-        paper_summary = paper_sections.get("Abstract", "") + " " + paper_sections.get("Introduction", "")
+        if not functions:
+            return {}
 
-        print("3. Generating function descriptions...")
-        for i, func in enumerate(functions):
-            print(f"  - Generating description for `{func.name}` ({i+1}/{len(functions)})")
-            func.function_description = self.function_describer.generate_function_description(func)
+        semaphore = asyncio.Semaphore(self.config.get('llm_concurrency', 4))
 
-        all_docs = {}
+        trivial = [func for func in functions if self.is_trivial(func)]
+        candidates = [func for func in functions if not self.is_trivial(func)]
+        print(f"Skipping descriptions and paper context for {len(trivial)} trivial functions")
 
+        print("3. Generating function descriptions...")
+        await asyncio.gather(*(self.describe_function(func, semaphore) for func in candidates))
 
         print(f"Generating documentation for {len(functions)} functions...")
-        for i, func in enumerate(functions):
-            print(f"  - Processing `{func.name}` ({i+1}/{len(functions)})")
+        tasks = [self.document_function(func, [], paper_summary, False, semaphore) for func in trivial]
 
-            is_relevant = self.function_describer.check_relevance_to_paper(
-                func.function_description,
-                paper_summary
-            )
+        if candidates:
+            print("Retrieving paper context...")
+            queries = [
+                func.function_description if func.function_description else f"{func.name} {' '.join(func.algorithm_keywords)}"
+                for func in candidates
+            ]
+            query_embeddings = self.paper_processor.encode_queries(queries)
+            relevant_content = self.paper_processor.query_rag_db_by_embeddings(query_embeddings, n_results=3)
 
-            if is_relevant:
-                print(f"    - Function is relevant to paper, including academic context")
-                query = func.function_description if func.function_description else f"{func.name} {' '.join(func.algorithm_keywords)}"
-                relevant_content = self.paper_processor.query_rag_db(query, n_results=3)
-                docs_for_func = [{'text': doc} for doc in relevant_content['documents'][0]]
-                include_academic_context = True
-            else:
-                print(f"    - Function is not relevant to paper, generating description only")
-                docs_for_func = []
-                include_academic_context = False
+            # Embeddings are normalized, so the dot product is the cosine similarity
+            summary_embedding = self.paper_processor.encode_queries([paper_summary])[0]
+            similarities = query_embeddings @ summary_embedding
+            relevance_threshold = self.config.get('relevance_threshold', 0.3)
 
-            doc_content = self.doc_generator.create_function_documentation(
-                func, docs_for_func, self.config, include_academic_context
+            tasks.extend(
+                self.document_function(func, [{'text': doc} for doc in documents], paper_summary, similarity >= relevance_threshold, semaphore)
+                for func, documents, similarity in zip(candidates, relevant_content['documents'], similarities)
             )
-            doc_content += f"\n\n\nFile path: {func.file_path}\n"
-            all_docs[f"functions/{func.name}.md"] = doc_content
+
+        results = await asyncio.gather(*tasks)
+
+        docs_by_func = {id(func): doc_content for func, doc_content in zip(trivial + candidates, results)}
+        all_docs = {}
+        for func in functions:
+            all_docs[f"functions/{func.name}.md"] = docs_by_func[id(func)]
 
         return all_docs
+
+    def is_trivial(self, func: FunctionInfo) -> bool:
+        return (not func.algorithm_keywords and not func.includes_math and
+                len(func.body_preview) < self.config.get('trivial_body_chars', 200))
+
+    async def describe_function(self, func: FunctionInfo, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            func.function_description = await self.function_describer.generate_function_description(func)
+        print(f"  - Generated description for `{func.name}`")
+
+    async def document_function(self, func: FunctionInfo, docs_for_func: List[Dict], paper_summary: str, may_be_relevant: bool, semaphore: asyncio.Semaphore) -> str:
+        if may_be_relevant:
+            async with semaphore:
+                bundle = await self.doc_generator.generate_bundle(
+                    func, paper_summary, docs_for_func, self.config
+                )
+            is_relevant = bundle['relevant']
+            doc_content = bundle['doc']
+        else:
+            async with semaphore:
+                doc_content = await self.doc_generator.create_function_documentation(
+                    func, [], self.config, include_academic_context=False
+                )
+            is_relevant = False
+
+        if is_relevant:
+            print(f"  - `{func.name}` is relevant to paper, included academic context")
+        else:
+            print(f"  - `{func.name}` is not relevant to paper, generated description only")
+
+        doc_content += f"\n\n\nFile path: {func.file_path}\n"
+        return doc_content
@@ -1,27 +1,32 @@
 import ollama
+from diskcache import Cache
 import google.generativeai as genai
 from typing import Dict, Any
 from src.cpp_analyzer import FunctionInfo
+from src.cache import content_key
 
 class FunctionDescriber:
     def __init__(self, config: Dict[str, Any]):
         self.config = config
         self.provider = config.get('llm_provider', 'ollama')
+        self.cache = Cache(config.get('cache_path', 'data/cache'))
 
         if self.provider == 'ollama':
             self.ollama_base_url = config.get('ollama_base_url', 'http://localhost:11434')
             self.ollama_model_name = config.get('ollama_model_name', 'llama3.1')
+            self.ollama_client = ollama.AsyncClient(host=self.ollama_base_url)
         elif self.provider == 'gemini':
             self.gemini_api_key = config.get('gemini_api_key')
             self.gemini_model_name = config.get('gemini_model_name', 'gemini-1.5-flash')
             if self.gemini_api_key:
                 genai.configure(api_key=self.gemini_api_key)
+                self._model = genai.GenerativeModel(self.gemini_model_name)
             else:
                 raise ValueError("Gemini API key is required when using Gemini provider")
         else:
             raise ValueError(f"Unsupported LLM provider: {self.provider}")
 
-    def generate_function_description(self, function_info: FunctionInfo) -> str:
+    async def generate_function_description(self, function_info: FunctionInfo) -> str:
         prompt = f"""
         Generate a concise, semantic description of the following C++ function for use in vector search queries.
         The description should be 1-2 sentences that capture the function's purpose, algorithm, and key characteristics.
@@ -40,15 +45,19 @@ class FunctionDescriber:
         """
 
         if self.provider == 'ollama':
-            return self.generate_with_ollama(prompt)
+            return await self.generate_with_ollama(prompt)
         elif self.provider == 'gemini':
-            return self.generate_with_gemini(prompt)
+            return await self.generate_with_gemini(prompt)
         else:
             raise ValueError(f"Unsupported provider: {self.provider}")
 
-    def generate_with_ollama(self, prompt: str) -> str:
+    async def generate_with_ollama(self, prompt: str) -> str:
+        key = content_key(prompt, self.ollama_model_name)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
         try:
-            response = ollama.chat(
+            response = await self.ollama_client.chat(
                 model=self.ollama_model_name,
                 messages=[
                     {"role": "system", "content": "You are a C++ code analyst specializing in algorithmic descriptions."},
@@ -58,83 +67,28 @@ class FunctionDescriber:
                     "num_predict": 150
                 }
             )
-            return response['message']['content'].strip()
+            result = response['message']['content'].strip()
+            self.cache.set(key, result)
+            return result
         except Exception as e:
             return f"Error generating description with Ollama: {e}"
 
-    def generate_with_gemini(self, prompt: str) -> str:
+    async def generate_with_gemini(self, prompt: str) -> str:
+        key = content_key(prompt, self.gemini_model_name)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
         try:
-            model = genai.GenerativeModel(self.gemini_model_name)
             generation_config = genai.types.GenerationConfig(
                 max_output_tokens=150,
                 temperature=0.3
             )
-            response = model.generate_content(
+            response = await self._model.generate_content_async(
                 prompt,
                 generation_config=generation_config
             )
-            return response.text.strip()
+            result = response.text.strip()
+            self.cache.set(key, result)
+            return result
         except Exception as e:
             return f"Error generating description with Gemini: {e}"
-
-    def check_relevance_to_paper(self, function_description: str, paper_summary: str) -> bool:
-        """
-        Check if the function description is relevant to the academic paper content.
-        Returns True if relevant, False otherwise.
-        """
-        prompt = f"""
-        Determine if the following function description is relevant to the academic paper content.
-        Consider algorithmic concepts, data structures, computational approaches, and technical domains.
-
-        **Function Description:**
-        {function_description}
-
-        **Paper Summary:**
-        {paper_summary}
-
-        **Task:**
-        Analyze if the function's algorithmic concepts and purpose align with the paper's content.
-        Respond with only "RELEVANT" or "NOT_RELEVANT".
-        """
-
-        if self.provider == 'ollama':
-            return self.check_relevance_with_ollama(prompt)
-        elif self.provider == 'gemini':
-            return self.check_relevance_with_gemini(prompt)
-        else:
-            raise ValueError(f"Unsupported provider: {self.provider}")
-
-    def check_relevance_with_ollama(self, prompt: str) -> bool:
-        try:
-            response = ollama.chat(
-                model=self.ollama_model_name,
-                messages=[
-                    {"role": "system", "content": "You are an expert at determining relevance between code and academic content."},
-                    {"role": "user", "content": prompt}
-                ],
-                options={
-                    "num_predict": 20
-                }
-            )
-            result = response['message']['content'].strip().upper()
-            return result == "RELEVANT"
-        except Exception as e:
-            print(f"Error checking relevance with Ollama: {e}")
-            return False
-
-    def check_relevance_with_gemini(self, prompt: str) -> bool:
-        try:
-            model = genai.GenerativeModel(self.gemini_model_name)
-            generation_config = genai.types.GenerationConfig(
-                max_output_tokens=20,
-                temperature=0.1 
-            )
-            response = model.generate_content(
-                prompt,
-                generation_config=generation_config
-            )
-            result = response.text.strip().upper()
-            return result == "RELEVANT"
-        except Exception as e:
-            print(f"Error checking relevance with Gemini: {e}")
-            return False
@@ -1,6 +1,7 @@
 import os
 import yaml
 import json
+from concurrent.futures import ThreadPoolExecutor
 from src.cpp_analyzer import CppAnalyzer
 from src.paper_processor import PaperProcessor
 from src.doc_generator import DocGenerator, FunctionDocGen
@@ -9,31 +10,29 @@ def load_config(config_path: str = 'src/config.yaml') -> dict:
     with open(config_path, 'r') as f:
         return yaml.safe_load(f)
 
+def write_file(path: str, content: str):
+    with open(path, 'w') as f:
+        f.write(content)
+
 def save_documentation(docs: dict, output_path: str):
-    if not os.path.exists(output_path):
-        os.makedirs(output_path)
-    
-    function_docs_path = os.path.join(output_path, 'functions')
-    if not os.path.exists(function_docs_path):
-        os.makedirs(function_docs_path)
-
-    for file_name, content in docs.items():
-        if file_name.startswith('functions/'):
-            full_path = os.path.join(output_path, file_name)
-        else:
-            full_path = os.path.join(output_path, file_name)
-        
-        with open(full_path, 'w') as f:
-            f.write(content)
+    os.makedirs(os.path.join(output_path, 'functions'), exist_ok=True)
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        paths = [os.path.join(output_path, file_name) for file_name in docs]
+        list(executor.map(write_file, paths, docs.values()))
     print(f"Documentation saved to {output_path}")
 
 def main():
     config = load_config()
 
-    cpp_analyzer = CppAnalyzer(repo_path=config['cpp_repo_path'])
+    cpp_analyzer = CppAnalyzer(
+        repo_path=config['cpp_repo_path'],
+        cpp_parser=config.get('cpp_parser', 'tree-sitter')
+    )
     paper_processor = PaperProcessor(
         chroma_db_path=config['chroma_db_path'],
-        embedding_model=config['embedding_model']
+        embedding_model=config['embedding_model'],
+        cache_path=config.get('cache_path', 'data/cache')
     )
     doc_generator = DocGenerator(config)
 
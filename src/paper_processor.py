@@ -3,55 +3,75 @@ import re
 from typing import List, Dict
 import fitz  # PyMuPDF
 import chromadb
+import torch
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from sentence_transformers import SentenceTransformer
+from diskcache import Cache
+from src.cache import content_key
+
+SECTION_NAMES = [
+    "Abstract", "Introduction", "Methods", "Methodology",
+    "Results", "Discussion", "Conclusion", "References"
+]
+_SECTION_RE = re.compile("|".join(SECTION_NAMES), re.IGNORECASE)
+_SECTION_LOOKUP = {name.lower(): name for name in SECTION_NAMES}
+_ALGO_RE = re.compile(r"(Algorithm|Procedure|Pseudocode)\s+\d+:.*?(?=(Algorithm|Procedure|Pseudocode|$))", re.DOTALL | re.IGNORECASE)
+_FORMULA_RE = re.compile(r"(\(Eq\.?\s*\d+\)|\[\d+\]|\(\d+\))", re.IGNORECASE)
+
+HNSW_METADATA = {
+    "hnsw:space": "cosine",
+    "hnsw:construction_ef": 200,
+    "hnsw:M": 32,
+    "hnsw:search_ef": 64
+}
 
 class PaperProcessor:
-    def __init__(self, chroma_db_path: str, embedding_model: str):
+    def __init__(self, chroma_db_path: str, embedding_model: str, cache_path: str = 'data/cache'):
         self.chroma_db_path = chroma_db_path
         self.embedding_model_name = embedding_model
-        self.embedding_model = SentenceTransformer(embedding_model)
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.embedding_model = SentenceTransformer(embedding_model, device=device)
+        if device == 'cuda':
+            self.embedding_model.half()
+        self.cache = Cache(cache_path)
         self.client = chromadb.PersistentClient(path=self.chroma_db_path)
-        self.collection = self.client.get_or_create_collection(name="academic_paper")
+        self.collection = self.client.get_or_create_collection(name="academic_paper", metadata=HNSW_METADATA)
+        # Chroma ignores metadata for existing collections, so rebuild ones created with other
+        # settings; this also drops untagged chunks written before papers were hashed
+        existing = self.collection.metadata or {}
+        if any(existing.get(key) != value for key, value in HNSW_METADATA.items()):
+            print("Recreating RAG collection with tuned HNSW settings.")
+            self.client.delete_collection(name="academic_paper")
+            self.collection = self.client.create_collection(name="academic_paper", metadata=HNSW_METADATA)
 
     def extract_text_from_pdf(self, pdf_path: str) -> Dict[str, str]:
-        doc = fitz.open(pdf_path)
-        sections = {}
+        sections: Dict[str, List[str]] = {}
         current_section = "Introduction"
-        sections[current_section] = ""
-
-        section_patterns = [
-            r"Abstract", r"Introduction", r"Methods", r"Methodology", 
-            r"Results", r"Discussion", r"Conclusion", r"References"
-        ]
-
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            text = page.get_text()
-            
-            for pattern in section_patterns:
-                if re.match(pattern, text, re.IGNORECASE):
-                    current_section = pattern
-                    if current_section not in sections:
-                        sections[current_section] = ""
-            
-            sections[current_section] += text
+        sections[current_section] = []
+
+        with fitz.open(pdf_path) as doc:
+            for page in doc:
+                text = page.get_text()
+
+                section_match = _SECTION_RE.match(text)
+                if section_match:
+                    current_section = _SECTION_LOOKUP[section_match.group(0).lower()]
+                    sections.setdefault(current_section, [])
+
+                sections[current_section].append(text)
         
-        return sections
+        return {section: "".join(pages) for section, pages in sections.items()}
 
     def extract_algorithms_and_formulas(self, sections: Dict[str, str]) -> Dict[str, List]:
         extractions = {'algorithms': [], 'formulas': []}
-        
-        algo_pattern = re.compile(r"(Algorithm|Procedure|Pseudocode)\s+\d+:.*?(?=(Algorithm|Procedure|Pseudocode|$))", re.DOTALL | re.IGNORECASE)
-        formula_pattern = re.compile(r"(\(Eq\.?\s*\d+\)|\[\d+\]|\(\d+\))", re.IGNORECASE)
 
         for _, content in sections.items():
-            found_algos = algo_pattern.findall(content)
+            found_algos = _ALGO_RE.findall(content)
             if found_algos:
                 extractions['algorithms'].extend([algo[0] for algo in found_algos])
 
             for line in content.split('\n'):
-                if formula_pattern.search(line):
+                if _FORMULA_RE.search(line):
                     extractions['formulas'].append(line.strip())
         
         return extractions
@@ -73,30 +93,72 @@ class PaperProcessor:
                 })
         return chunks
 
-    def add_to_rag_db(self, chunks: List[Dict]):
+    def add_to_rag_db(self, chunks: List[Dict], batch_size=128, id_prefix="chunk"):
         documents = [chunk['text'] for chunk in chunks]
         metadatas = [chunk['metadata'] for chunk in chunks]
-        ids = [f"chunk_{i}" for i in range(len(chunks))]
+        ids = [f"{id_prefix}_{i}" for i in range(len(chunks))]
         
-        embeddings = self.embedding_model.encode(documents, show_progress_bar=True)
+        keys = [content_key(document, self.embedding_model_name) for document in documents]
+        embeddings = [self.cache.get(key) for key in keys]
+        to_encode = [i for i, embedding in enumerate(embeddings) if embedding is None]
+
+        if to_encode:
+            encoded = self.embedding_model.encode(
+                [documents[i] for i in to_encode],
+                batch_size=batch_size,
+                show_progress_bar=True,
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            )
+            for i, embedding in zip(to_encode, encoded.tolist()):
+                embeddings[i] = embedding
+                self.cache.set(keys[i], embedding)
+        print(f"Reused {len(documents) - len(to_encode)} cached embeddings, encoded {len(to_encode)} chunks.")
         
         self.collection.add(
-            embeddings=embeddings.tolist(),
+            embeddings=embeddings,
             documents=documents,
             metadatas=metadatas,
             ids=ids
         )
 
     def query_rag_db(self, query: str, n_results=5) -> List[Dict]:
-        query_embedding = self.embedding_model.encode([query])[0].tolist()
+        return self.query_rag_db_batch([query], n_results=n_results)
+
+    def encode_queries(self, queries: List[str], batch_size=64):
+        return self.embedding_model.encode(
+            queries,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        )
+
+    def query_rag_db_batch(self, queries: List[str], n_results=5, batch_size=64) -> Dict:
+        return self.query_rag_db_by_embeddings(self.encode_queries(queries, batch_size=batch_size), n_results=n_results)
+
+    def query_rag_db_by_embeddings(self, query_embeddings, n_results=5) -> Dict:
         results = self.collection.query(
-            query_embeddings=[query_embedding],
+            query_embeddings=query_embeddings.tolist(),
             n_results=n_results
         )
         return results
 
-    def process_paper(self, pdf_path: str):
+    def paper_hash(self, pdf_path: str) -> str:
+        return content_key(f"{pdf_path}:{os.path.getmtime(pdf_path)}", self.embedding_model_name)
+
+    def process_paper(self, pdf_path: str) -> Dict[str, str]:
         sections = self.extract_text_from_pdf(pdf_path)
+
+        paper_path = os.path.abspath(pdf_path)
+        paper_hash = self.paper_hash(paper_path)
+        if self.collection.get(where={"paper_hash": paper_hash}, limit=1, include=[])['ids']:
+            print("Paper is unchanged since the last run, reusing its chunks in the RAG database.")
+            return sections
+
+        self.collection.delete(where={"paper_path": paper_path})
         chunks = self.chunk_text(sections)
-        self.add_to_rag_db(chunks)
+        for chunk in chunks:
+            chunk['metadata'].update({'paper_path': paper_path, 'paper_hash': paper_hash})
+        self.add_to_rag_db(chunks, id_prefix=paper_hash)
         print(f"Processed paper and added {len(chunks)} chunks to the RAG database.")
+        return sections
@@ -0,0 +1,98 @@
+import os
+
+from src.cpp_analyzer import CppAnalyzer
+
+SOURCE = """
+namespace geo {
+class Router {
+public:
+    int width() const { return w; }
+    ~Router() {}
+private:
+    int w;
+};
+}
+
+Foo& Foo::refRet(int a) { return *this; }
+std::vector<int>& A::g() { return v; }
+int* ns::Foo::ptrRet() { return nullptr; }
+const char* A::h() { return ""; }
+const int Foo::constRet() { return 1; }
+auto area(const std::map<int, int>& m) -> double { return sqrt(m.size()); }
+void geo::Router::sortNets(std::vector<int>& nets, int = 5, int b = 3) {
+    std::sort(nets.begin(), nets.end());
+}
+"""
+
+
+def extract(source, cpp_parser='tree-sitter'):
+    analyzer = CppAnalyzer(repo_path='.', cpp_parser=cpp_parser)
+    functions = analyzer.extract_functions_from_text(source, 'test.cpp')
+    return {func.full_qualified_name: func for func in functions}
+
+
+def test_tree_sitter_finds_functions():
+    functions = extract(SOURCE)
+    assert set(functions) == {
+        'geo::Router::width', 'Foo::refRet', 'A::g', 'ns::Foo::ptrRet', 'A::h',
+        'Foo::constRet', 'area', 'geo::Router::sortNets'
+    }
+
+
+def test_tree_sitter_keeps_return_type_qualifiers():
+    functions = extract(SOURCE)
+    assert functions['Foo::refRet'].return_type == 'Foo&'
+    assert functions['A::g'].return_type == 'std::vector<int>&'
+    assert functions['ns::Foo::ptrRet'].return_type == 'int*'
+    assert functions['A::h'].return_type == 'const char*'
+    assert functions['Foo::constRet'].return_type == 'const int'
+    assert functions['area'].return_type == 'double'
+
+
+def test_tree_sitter_parameters_and_scopes():
+    func = extract(SOURCE)['geo::Router::sortNets']
+    assert func.namespace == 'geo'
+    assert func.class_name == 'Router'
+    assert func.parameters == [
+        {'name': 'nets', 'type': 'std::vector<int>&'},
+        {'name': 'param', 'type': 'int'},
+        {'name': 'b', 'type': 'int'},
+    ]
+    assert func.line_start == 18
+    assert func.line_end == 20
+    assert func.algorithm_keywords == ['sort']
+    assert extract(SOURCE)['area'].includes_math
+
+
+def test_regex_parser_finds_qualified_functions():
+    functions = extract(SOURCE, cpp_parser='regex')
+    assert functions['geo::Router::sortNets'].parameters[0] == {'name': 'nets', 'type': 'std::vector<int>&'}
+    assert functions['Foo::refRet'].return_type == 'Foo&'
+
+
+def test_find_cpp_files(tmp_path):
+    (tmp_path / 'src' / 'nested').mkdir(parents=True)
+    (tmp_path / 'main.cpp').write_text('')
+    (tmp_path / 'src' / 'router.hpp').write_text('')
+    (tmp_path / 'src' / 'nested' / 'graph.cc').write_text('')
+    (tmp_path / 'src' / 'notes.txt').write_text('')
+
+    found = CppAnalyzer(repo_path=str(tmp_path)).find_cpp_files()
+    assert sorted(os.path.relpath(path, tmp_path) for path in found) == [
+        'main.cpp', os.path.join('src', 'nested', 'graph.cc'), os.path.join('src', 'router.hpp')
+    ]
+
+
+def test_find_cpp_files_missing_repo(tmp_path):
+    assert CppAnalyzer(repo_path=str(tmp_path / 'missing')).find_cpp_files() == []
+
+
+def test_regex_parser_scans_mapped_file(tmp_path):
+    path = tmp_path / 'graph.cpp'
+    path.write_text("int B::g(double y) { return y; }\n}\nvoid C::h(int z) {\n    z++;\n}\n")
+
+    functions = CppAnalyzer(repo_path=str(tmp_path), cpp_parser='regex').analyze_file(str(path))
+    assert [(func.full_qualified_name, func.line_start, func.line_end) for func in functions] == [
+        ('B::g', 1, 1), ('C::h', 3, 5)
+    ]
+    assert functions[1].body_preview == '{\n    z++;\n}'